@@ -157,3 +157,86 @@ def is_user_verified(email):
         return False
     finally:
         connection.close()
+
+
+def save_image_mask(filename, user_id, original_key, mask_key, width, height, mask_bytes):
+    connection = get_db_connection()
+    if not connection:
+        print("Database connection failed")
+        return False
+        
+    try:
+        cursor = connection.cursor()
+        cursor.execute(
+            'INSERT INTO image_masks (filename, user_id, original_key, mask_key, width, height, mask_bytes) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s)',
+            (filename, user_id, original_key, mask_key, width, height, mask_bytes)
+        )
+        connection.commit()
+        cursor.close()
+        return True
+    except Exception as e:
+        print(f"Error saving image mask: {e}")
+        return False
+    finally:
+        connection.close()
+
+
+def get_image_mask(filename):
+    connection = get_db_connection()
+    if not connection:
+        print("Database connection failed")
+        return None
+        
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute('SELECT * FROM image_masks WHERE filename = %s', (filename,))
+        result = cursor.fetchone()
+        cursor.close()
+        return result
+    except Exception as e:
+        print(f"Error getting image mask: {e}")
+        return None
+    finally:
+        connection.close()
+
+
+def get_image_masks_before(cutoff):
+    connection = get_db_connection()
+    if not connection:
+        print("Database connection failed")
+        return None
+        
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(
+            'SELECT DISTINCT original_key, mask_key FROM image_masks WHERE created_at < FROM_UNIXTIME(%s)',
+            (cutoff,)
+        )
+        result = cursor.fetchall()
+        cursor.close()
+        return result
+    except Exception as e:
+        print(f"Error getting expired image masks: {e}")
+        return None
+    finally:
+        connection.close()
+
+
+def delete_image_mask(original_key):
+    connection = get_db_connection()
+    if not connection:
+        print("Database connection failed")
+        return False
+        
+    try:
+        cursor = connection.cursor()
+        cursor.execute('DELETE FROM image_masks WHERE original_key = %s', (original_key,))
+        connection.commit()
+        cursor.close()
+        return True
+    except Exception as e:
+        print(f"Error deleting image mask: {e}")
+        return False
+    finally:
+        connection.close()
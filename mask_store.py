@@ -0,0 +1,149 @@
+import os
+import time
+import uuid
+import logging
+from io import BytesIO
+from PIL import Image, ImageChops, ImageFilter, ImageOps
+
+from db import save_image_mask, get_image_mask, get_image_masks_before, delete_image_mask
+from s3_helper import upload_to_s3, download_from_s3, delete_from_s3
+
+# Originals and masks are private objects; only the flattened results are public
+BUCKET_NAME = os.getenv("BUCKET_NAME")
+MASK_PREFIX = "remove-background-masks"
+MASK_RETENTION_DAYS = int(os.getenv('MASK_RETENTION_DAYS', '30'))
+MAX_OUTPUT_SIDE = 4096
+MAX_FEATHER_RADIUS = 50
+CONTENT_TYPES = {'png': 'image/png', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg'}
+
+
+def _mask_keys(original_ext):
+    # A random id keeps uploads in the same second from overwriting each other
+    object_id = uuid.uuid4().hex
+    original_key = f"{MASK_PREFIX}/{object_id}_original.{original_ext}"
+    mask_key = f"{MASK_PREFIX}/{object_id}_mask.png"
+    return original_key, mask_key
+
+
+def open_original(file_obj):
+    """Open an upload upright, so it lines up with the mask predicted from it."""
+    with Image.open(file_obj) as image:
+        return ImageOps.exif_transpose(image).convert("RGBA")
+
+
+def save_mask(filename, file_bytes, original_ext, mask, user_id):
+    """Store the uploaded bytes and the single-channel alpha mask for later re-edits."""
+    original_key, mask_key = _mask_keys(original_ext)
+
+    mask = mask.convert('L')
+    mask_stream = BytesIO()
+    mask.save(mask_stream, format='PNG', optimize=True)
+    mask_bytes = mask_stream.tell()
+    mask_stream.seek(0)
+
+    content_type = CONTENT_TYPES.get(original_ext, 'application/octet-stream')
+    if not upload_to_s3(BytesIO(file_bytes), BUCKET_NAME, original_key, public=False, content_type=content_type):
+        return False
+    if not (upload_to_s3(mask_stream, BUCKET_NAME, mask_key, public=False)
+            and save_image_mask(filename, user_id, original_key, mask_key,
+                                mask.width, mask.height, mask_bytes)):
+        # Without an index row the purge job would never find these objects
+        delete_from_s3(BUCKET_NAME, original_key)
+        delete_from_s3(BUCKET_NAME, mask_key)
+        return False
+
+    logging.info(f"Stored mask for {filename}: original {len(file_bytes)} + mask {mask_bytes} bytes "
+                 f"({mask.width}x{mask.height})")
+    return True
+
+
+def _owned_record(filename, user_id):
+    record = get_image_mask(filename)
+    if not record or record['user_id'] != user_id:
+        return None
+    return record
+
+
+def link_mask(new_filename, filename, user_id):
+    """Point a derived result (e.g. a new background) at the mask it was built from."""
+    record = _owned_record(filename, user_id)
+    if not record:
+        return False
+    return save_image_mask(new_filename, user_id, record['original_key'], record['mask_key'],
+                           record['width'], record['height'], record['mask_bytes'])
+
+
+def load_mask(filename, user_id):
+    """Return (original, mask) for a file owned by user_id, or None if no mask is stored."""
+    record = _owned_record(filename, user_id)
+    if not record:
+        return None
+
+    original_file = download_from_s3(BUCKET_NAME, record['original_key'])
+    mask_file = download_from_s3(BUCKET_NAME, record['mask_key'])
+    if original_file is None or mask_file is None:
+        return None
+
+    original = open_original(original_file)
+    with Image.open(mask_file) as mask:
+        mask = mask.convert("L")
+    return original, mask
+
+
+def scaled_size(size, width=None, height=None):
+    """Resolve a requested output size, keeping the aspect ratio if one side is missing."""
+    src_width, src_height = size
+    if width and not height:
+        height = src_height * width / src_width
+    elif height and not width:
+        width = src_width * height / src_height
+    elif not width and not height:
+        width, height = size
+
+    # One shared factor keeps the aspect ratio when a side exceeds the limit
+    scale = min(1, MAX_OUTPUT_SIDE / width, MAX_OUTPUT_SIDE / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def render_foreground(original, mask, size=None, feather=0):
+    """Cut the original out with its mask, optionally resizing and feathering edges.
+
+    The feather radius is in output pixels.
+    """
+    if mask.size != original.size:
+        raise ValueError(f"Mask size {mask.size} does not match image size {original.size}")
+
+    if size and size != original.size:
+        original = original.resize(size, Image.LANCZOS)
+        mask = mask.resize(size, Image.LANCZOS)
+
+    feather = min(feather or 0, MAX_FEATHER_RADIUS)
+    if feather > 0:
+        mask = mask.filter(ImageFilter.GaussianBlur(feather))
+
+    # Only the alpha is masked; colours stay intact for alpha_composite's straight alpha
+    result = original.copy()
+    result.putalpha(ImageChops.multiply(original.getchannel('A'), mask))
+    return result
+
+
+def purge_expired_masks(retention_days=MASK_RETENTION_DAYS):
+    """Delete stored originals and masks older than the retention period."""
+    cutoff = time.time() - retention_days * 86400
+    records = get_image_masks_before(cutoff)
+    if records is None:
+        return 0
+
+    removed = 0
+    for record in records:
+        for key in (record['original_key'], record['mask_key']):
+            if delete_from_s3(BUCKET_NAME, key):
+                removed += 1
+        delete_image_mask(record['original_key'])
+    logging.info(f"Purged {removed} stored mask objects older than {retention_days} days")
+    return removed
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    purge_expired_masks()
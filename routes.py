@@ -7,8 +7,10 @@ import logging
 import os
 import time
 import hashlib
+import uuid
 from db import create_user, get_db_connection, get_user_by_username_and_password, get_user_attempts, update_user_attempts, update_verification_status
 from s3_helper import upload_to_s3, get_s3_url, download_from_s3
+from mask_store import open_original, save_mask, load_mask, link_mask, render_foreground, scaled_size
 from dotenv import load_dotenv
 from ses_helper import send_email_with_image_link, verify_email
 from urllib.parse import urlparse
@@ -114,31 +116,26 @@ def upload_file():
             file_stream = BytesIO(file_bytes)
             
             try:
-                input_image = Image.open(file_stream).convert("RGBA")
+                # Apply the EXIF rotation up front so the mask matches the stored original
+                input_image = open_original(file_stream)
             except UnidentifiedImageError:
                 flash('Invalid image file.', 'danger')
                 return render_template('index.html', logged_in=logged_in)
 
-            # Prepare input for rembg
-            input_bytes = BytesIO()
-            input_image.save(input_bytes, format='PNG')
-            input_bytes = input_bytes.getvalue()
+            # Only the mask comes from the model; the cutout is composited from it so
+            # later edits can reuse the stored mask instead of rerunning inference
+            start = time.time()
+            mask = remove(input_image, only_mask=True)
+            logging.info(f"Background removal inference took {time.time() - start:.3f}s")
             
-            if not input_bytes:
-                flash('Failed to process image data', 'danger')
-                return render_template('index.html', logged_in=logged_in)
-
-            # Process with rembg
-            output_bytes = remove(input_bytes)
-            
-            if not output_bytes:
+            if mask is None:
                 flash('Background removal failed - empty result', 'danger')
                 return render_template('index.html', logged_in=logged_in)
                 
-            output_image = Image.open(BytesIO(output_bytes))
+            output_image = render_foreground(input_image, mask)
 
             timestamp = int(time.time())
-            filename = f"image_rmbg_{timestamp}.png"
+            filename = f"image_rmbg_{timestamp}_{uuid.uuid4().hex[:8]}.png"
             
             # Create directory if it doesn't exist
             os.makedirs(os.path.join('static', 'processed'), exist_ok=True)
@@ -147,6 +144,16 @@ def upload_file():
             save_path = os.path.join('static', 'processed', filename)
             output_image.save(save_path)
             
+            # Keep the original and mask so re-edits skip the model; only logged-in
+            # users can re-edit, so anonymous uploads are not kept
+            if logged_in:
+                try:
+                    original_ext = file.filename.rsplit('.', 1)[1].lower()
+                    if not save_mask(filename, file_bytes, original_ext, mask, session['user_id']):
+                        logging.error(f"Failed to store image mask for {filename}")
+                except Exception as e:
+                    logging.error(f"Failed to store image mask: {e}")
+            
             # Upload to S3 and get CloudFront URL
             s3_key = f"remove-background-imgs/{filename}"
             with open(save_path, 'rb') as image_file:
@@ -284,6 +291,12 @@ def apply_background():
     from urllib.parse import urlparse
     print("Session inside apply_background:", dict(session))
 
+    if 'user_id' not in session:
+        flash('You need to login to select background.', 'warning')
+        return redirect(url_for('main.login'))
+
+    user_id = session['user_id']
+
     filename = request.form.get('filename')
     background_url = request.form.get('background_url')
 
@@ -291,9 +304,32 @@ def apply_background():
         flash("Missing required data to apply background.", 'danger')
         return redirect(url_for('main.upload_file'))
 
+    width = request.form.get('width', type=int)
+    height = request.form.get('height', type=int)
+    feather = request.form.get('feather', 0, type=float)
+
+    if (width is not None and width <= 0) or (height is not None and height <= 0) or feather < 0:
+        flash('Width and height must be positive and feathering cannot be negative.', 'danger')
+        return redirect(url_for('main.change_background', filename=filename))
+
     try:
-        fg_path = os.path.join('static', 'processed', filename)
-        foreground = Image.open(fg_path).convert("RGBA")
+        start = time.time()
+        stored = load_mask(filename, user_id)
+        if stored:
+            original, mask = stored
+            size = scaled_size(original.size, width, height)
+            foreground = render_foreground(original, mask, size=size, feather=feather)
+        else:
+            # Results from before masks were stored only have the flattened cutout
+            fg_path = os.path.join('static', 'processed', filename)
+            with Image.open(fg_path) as fg_image:
+                foreground = fg_image.convert("RGBA")
+            size = scaled_size(foreground.size, width, height)
+            if size != foreground.size:
+                foreground = foreground.resize(size, Image.LANCZOS)
+            if feather > 0:
+                flash('Edge feathering is not available for this image; it was applied without it.', 'warning')
+        logging.info(f"Re-edit of {filename} rendered in {time.time() - start:.3f}s (stored mask: {bool(stored)})")
 
         parsed = urlparse(background_url)
         bg_key = parsed.path.lstrip('/')
@@ -304,7 +340,7 @@ def apply_background():
         result = Image.alpha_composite(background, foreground)
 
         timestamp = int(time.time())
-        new_filename = f"final_{timestamp}.png"
+        new_filename = f"final_{timestamp}_{uuid.uuid4().hex[:8]}.png"
         
         # Save locally for processing
         save_path = os.path.join('static', 'processed', new_filename)
@@ -318,7 +354,8 @@ def apply_background():
         # Get CloudFront URL
         cloudfront_url = get_s3_url(BUCKET_NAME, s3_key)
         
-        user_id = session['user_id']
+        if stored:
+            link_mask(new_filename, filename, user_id)
 
         return render_template("result.html", img_url=cloudfront_url, filename=new_filename, logged_in='user_id' in session)
 
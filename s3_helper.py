@@ -18,15 +18,15 @@ s3_client = boto3.client(
     region_name=AWS_REGION
 )
 
-def upload_to_s3(file_obj, bucket_name, object_name):
+def upload_to_s3(file_obj, bucket_name, object_name, public=True, content_type='image/png'):
     try:
         s3_client.upload_fileobj(
             file_obj,
             bucket_name,
             object_name,
             ExtraArgs={
-                'ACL': 'public-read', 
-                'ContentType': 'image/png'  
+                'ACL': 'public-read' if public else 'private', 
+                'ContentType': content_type  
             }
         )
         return True
@@ -48,4 +48,13 @@ def download_from_s3(bucket_name, object_name):
         return file_stream
     except ClientError as e:
         logging.error(f"Download failed: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def delete_from_s3(bucket_name, object_name):
+    try:
+        s3_client.delete_object(Bucket=bucket_name, Key=object_name)
+        return True
+    except ClientError as e:
+        logging.error(f"Delete failed: {e}")
+        return False
\ No newline at end of file